@@ -11,7 +11,8 @@ llm = LLM(
     api_key=API_KEY,
     model="gemini-2.5-flash",
     project="gen-lang-client-0931582473",
-    location="us-central1"
+    location="us-central1",
+    stream=True
 )
 
 # response = llm.run("Hello world!")  # FIXED LINE
@@ -63,3 +63,9 @@ async def get_current_user(
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
 
     return UserModel(**user)
+
+async def require_admin(current_user: UserModel = Depends(get_current_user)) -> UserModel:
+    """Allow only admin users."""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
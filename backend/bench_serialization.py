@@ -0,0 +1,86 @@
+# bench_serialization.py
+"""
+Compare the old read path (pydantic List[AnalysisResponse] + stdlib json)
+against the orjson path, with and without the summary projection and
+response compression.
+
+Usage: python bench_serialization.py [num_analyses] [iterations]
+"""
+import sys
+import gzip
+import json
+import time
+from datetime import datetime
+from typing import List
+
+import orjson
+from pydantic import TypeAdapter
+
+from models import AnalysisResponse
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def make_analysis(i: int) -> dict:
+    section = "Revenue grew 12% year over year while operating margin held at 18%. " * 40
+    return {
+        "_id": f"{i:024x}",
+        "document_id": f"{i // 4:024x}",
+        "user_id": "64f000000000000000000001",
+        "query": "Analyze this financial document for investment insights",
+        "status": "completed",
+        "local_summary": {
+            "summary": section[:500] + "...",
+            "word_count": 5400,
+            "financial_keywords_found": ["revenue", "profit", "cash flow", "risk"],
+            "confidence": 0.27,
+            "analysis_type": "basic_text_analysis",
+        },
+        "crew_result": {
+            "status": "success",
+            "result": {name: section for name in (
+                "analyze_financial_document", "investment_analysis",
+                "risk_assessment", "verification_task",
+            )},
+        },
+        "processing_time_seconds": 93.4,
+        "text_length": 48000,
+        "created_at": datetime(2024, 1, 1, 12, 0, 0),
+    }
+
+def summary_projection(doc: dict) -> dict:
+    return {k: v for k, v in doc.items() if k not in ("local_summary", "crew_result")}
+
+def timed(fn, iterations: int):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        out = fn()
+    return out, (time.perf_counter() - start) / iterations * 1000
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    docs = [make_analysis(i) for i in range(n)]
+    summaries = [summary_projection(d) for d in docs]
+    adapter = TypeAdapter(List[AnalysisResponse])
+
+    cases = {
+        "pydantic + json (current)": lambda: json.dumps(
+            adapter.dump_python(adapter.validate_python(docs), mode="json")
+        ).encode(),
+        "orjson full": lambda: orjson.dumps(docs),
+        "orjson summary view": lambda: orjson.dumps(summaries),
+    }
+
+    print(f"{n} analyses, {iterations} iterations")
+    print(f"{'path':<28}{'ms':>10}{'raw KB':>10}{'gzip KB':>10}{'br KB':>10}")
+    for name, fn in cases.items():
+        body, ms = timed(fn, iterations)
+        gz = len(gzip.compress(body, compresslevel=6)) / 1024
+        br = f"{len(brotli.compress(body, quality=4)) / 1024:>10.1f}" if brotli else f"{'n/a':>10}"
+        print(f"{name:<28}{ms:>10.2f}{len(body) / 1024:>10.1f}{gz:>10.1f}{br}")
+
+if __name__ == "__main__":
+    main()
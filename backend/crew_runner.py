@@ -1,18 +1,22 @@
 import asyncio
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from crewai import Crew, Process
 from agents import financial_analyst
+from streaming import open_stream, close_stream, current_stream
+from profiling import to_thread
 
 logger = logging.getLogger(__name__)
 
 async def run_crew_async(
     query: str, 
     document_text: str, 
-    timeout_s: int = 300
+    timeout_s: int = 300,
+    document_id: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Run CrewAI analysis and return structured results.
+    When document_id is given, streamed LLM output is published for it.
     """
     from task import (
         analyze_financial_document,
@@ -21,15 +25,19 @@ async def run_crew_async(
         verification_task,
     )
 
+    tasks = {
+        "analyze_financial_document": analyze_financial_document,
+        "investment_analysis": investment_analysis,
+        "risk_assessment": risk_assessment,
+        "verification_task": verification_task,
+    }
+    stream = open_stream(document_id, list(tasks)) if document_id else None
+
     crew = Crew(
         agents=[financial_analyst],
-        tasks=[
-            analyze_financial_document,
-            investment_analysis,
-            risk_assessment,
-            verification_task,
-        ],
+        tasks=list(tasks.values()),
         process=Process.sequential,
+        task_callback=stream.task_completed if stream else None,
         verbose=True
     )
     
@@ -40,8 +48,10 @@ async def run_crew_async(
             "document_text": document_text[:10000]
         }
         
+        # to_thread copies this context, so chunk events on the crew thread find the stream
+        current_stream.set(stream)
         result = await asyncio.wait_for(
-            asyncio.to_thread(crew.kickoff, inputs),
+            to_thread(crew.kickoff, inputs),
             timeout=timeout_s
         )
 
@@ -66,3 +76,7 @@ async def run_crew_async(
         error_msg = f"CrewAI analysis failed: {str(e)}"
         logger.error(error_msg, exc_info=True)
         return {"error": "crew_failure", "message": error_msg}
+
+    finally:
+        if document_id:
+            close_stream(document_id)
@@ -51,6 +51,10 @@ async def ensure_indexes():
         await db.documents.create_index([("file_id", ASCENDING)], unique=True)
         await db.analyses.create_index([("document_id", ASCENDING)])
         await db.analyses.create_index([("user_id", ASCENDING)])
+        await db.usage_stats.create_index([("user_id", ASCENDING), ("day", ASCENDING)], unique=True)
+        await db.documents.create_index([("status", ASCENDING), ("owner", ASCENDING)])
+        # Rows of processes that stopped heartbeating expire on their own
+        await db.workers.create_index([("heartbeat_at", ASCENDING)], expireAfterSeconds=3600)
         logger.info("Database indexes created successfully")
     except Exception as e:
         logger.error(f"Failed to create indexes: {e}")
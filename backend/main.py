@@ -1,20 +1,35 @@
 import os
+import re
 import uuid
+import socket
+import asyncio
 import logging
+from datetime import datetime, timedelta
 from contextlib import asynccontextmanager
 from typing import Optional, List
 from dotenv import load_dotenv
 
-from fastapi import FastAPI, UploadFile, File, Form, BackgroundTasks, HTTPException, Depends
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse, PlainTextResponse
 from fastapi.security import HTTPBearer
 import aiofiles
 from bson import ObjectId
+from pymongo import ReturnDocument
 from pydantic import BaseModel
 
 from db import db, ensure_indexes
 from task import analyze_document_and_save
-from auth import get_current_user, hash_password, verify_password, create_access_token
+from scheduler import scheduler
+from streaming import stream_events
+from stats import get_stats, ALL_USERS
+from statement_store import statement_store
+from statement_parser import normalize_metric
+from profiling import (
+    profiles, start_timed_profile, arm_document_profile, loop_monitor, LOOP_MONITOR_ENABLED
+)
+from auth import get_current_user, require_admin, hash_password, verify_password, create_access_token
 from models import AnalysisResponse, DocumentResponse, UserModel
 
 load_dotenv()
@@ -28,18 +43,97 @@ logger = logging.getLogger(__name__)
 
 security = HTTPBearer()
 
+# ---------------- Queue ownership ---------------- #
+# The scheduler (and its per-user caps) lives in one process. Each queued
+# document records the process that owns it, so with several processes a
+# restart only picks up documents whose owner is gone, and only once.
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+WORKER_HEARTBEAT_SECONDS = int(os.getenv("WORKER_HEARTBEAT_SECONDS", "30"))
+# A process that missed this many heartbeats is considered dead
+WORKER_STALE_SECONDS = WORKER_HEARTBEAT_SECONDS * 3
+
+async def worker_heartbeat() -> None:
+    while True:
+        try:
+            await db.workers.update_one(
+                {"_id": PROCESS_ID},
+                {"$set": {"heartbeat_at": datetime.utcnow()}},
+                upsert=True,
+            )
+        except Exception as e:
+            logger.warning(f"Worker heartbeat failed: {e}")
+        await asyncio.sleep(WORKER_HEARTBEAT_SECONDS)
+
+async def live_workers() -> List[str]:
+    since = datetime.utcnow() - timedelta(seconds=WORKER_STALE_SECONDS)
+    return [w["_id"] async for w in db.workers.find({"heartbeat_at": {"$gte": since}}, {"_id": 1})]
+
+async def requeue_documents() -> None:
+    """Claim and re-submit documents left queued by processes that are gone."""
+    live = await live_workers()
+    requeued = 0
+    cursor = db.documents.find({"status": "queued", "owner": {"$nin": live}}).sort("_id", 1)
+    async for doc in cursor:
+        # Compare-and-set on the previous owner: of several processes
+        # starting together, exactly one claims each document
+        doc = await db.documents.find_one_and_update(
+            {"_id": doc["_id"], "status": "queued", "owner": doc.get("owner")},
+            {"$set": {"owner": PROCESS_ID}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc is None:
+            continue
+        document_id = str(doc["_id"])
+        if "query" not in doc:
+            # Uploaded before the query was stored; nothing to re-run with
+            await db.documents.update_one(
+                {"_id": doc["_id"]},
+                {"$set": {"status": "failed", "error": "Analysis was dropped by a server restart", "failed_at": datetime.utcnow()}}
+            )
+            continue
+        scheduler.submit(
+            document_id,
+            doc["user_id"],
+            analyze_document_and_save,
+            document_id,
+            doc["path"],
+            doc["query"],
+            doc["user_id"],
+            role=doc.get("role", "viewer"),
+        )
+        requeued += 1
+    if requeued:
+        logger.info(f"Re-queued {requeued} documents from a previous run")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await ensure_indexes()
     logger.info("Database indexes ensured")
+    heartbeat = asyncio.create_task(worker_heartbeat())
+    await requeue_documents()
+    if LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
     yield
     logger.info("Shutting down...")
+    await loop_monitor.stop()
+    dropped = await scheduler.shutdown()
+    if dropped:
+        # Interrupted runs go back to the queue, released for the next process to claim
+        await db.documents.update_many(
+            {"_id": {"$in": [ObjectId(d) for d in dropped]}, "status": {"$in": ["queued", "processing"]}},
+            {"$set": {"status": "queued"}, "$unset": {"owner": "", "partial_results": "", "current_task": ""}}
+        )
+        logger.info(f"Left {len(dropped)} unfinished analyses queued for restart")
+    heartbeat.cancel()
+    await asyncio.gather(heartbeat, return_exceptions=True)
+    await db.workers.delete_one({"_id": PROCESS_ID})
 
 app = FastAPI(
     title="Financial Document Analyzer",
     version="1.0.0",
     description="AI-powered financial document analysis API",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # CORS
@@ -52,6 +146,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Response compression (brotli when available, gzip otherwise)
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+# Server-sent event streams must reach the client unbuffered
+UNCOMPRESSED_PATHS = [re.compile(r"^/analyses/[^/]+/stream$")]
+
+class SelectiveCompression:
+    """Apply a compression middleware to every path except UNCOMPRESSED_PATHS."""
+
+    def __init__(self, app, middleware_class, **options):
+        self.app = app
+        self.compressed_app = middleware_class(app, **options)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and any(p.match(scope["path"]) for p in UNCOMPRESSED_PATHS):
+            await self.app(scope, receive, send)
+        else:
+            await self.compressed_app(scope, receive, send)
+
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(
+        SelectiveCompression,
+        middleware_class=BrotliMiddleware,
+        minimum_size=COMPRESSION_MIN_SIZE,
+        gzip_fallback=True,
+    )
+except ImportError:
+    logger.warning("brotli-asgi not installed, falling back to gzip-only compression.")
+    app.add_middleware(SelectiveCompression, middleware_class=GZipMiddleware, minimum_size=COMPRESSION_MIN_SIZE)
+
 # File upload constraints
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
 ALLOWED_CONTENT_TYPES = ["application/pdf"]
@@ -64,6 +188,43 @@ def convert_objectids(doc: dict, fields: list[str]):
             doc[field] = str(doc[field])
     return doc
 
+# Fields clients may select or exclude via fields=/exclude=
+ANALYSIS_FIELDS = {
+    "document_id", "user_id", "query", "status", "local_summary", "crew_result",
+    "error", "processing_time_seconds", "text_length", "created_at",
+}
+DOCUMENT_FIELDS = {
+    "file_id", "filename", "content_type", "user_id", "status", "error",
+    "created_at", "processing_started_at", "analysis_completed_at",
+    "processing_time_seconds", "failed_at", "partial_results", "current_task",
+}
+# Streamed LLM text is served by /analyses/{id}/stream, not the document list
+DOCUMENT_DEFAULT_EXCLUDE = ["partial_results", "current_task"]
+ANALYSIS_SUMMARY_EXCLUDE = ["local_summary", "crew_result"]
+
+def parse_field_list(value: Optional[str]) -> list[str]:
+    return [f.strip() for f in value.split(",") if f.strip()] if value else []
+
+def build_projection(
+    allowed: set[str],
+    fields: Optional[str] = None,
+    exclude: Optional[str] = None,
+    default_exclude: Optional[list[str]] = None,
+) -> dict:
+    """Translate fields=/exclude= query params into a Mongo projection."""
+    include = parse_field_list(fields)
+    omit = parse_field_list(exclude) + (default_exclude or [])
+    if include and parse_field_list(exclude):
+        raise HTTPException(status_code=400, detail="Use either 'fields' or 'exclude', not both")
+
+    unknown = [f for f in include + omit if f not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    if include:
+        return {f: 1 for f in include if f not in omit} or {"_id": 1}
+    return {f: 0 for f in omit}
+
 # ----------------------- User Auth Models ----------------------- #
 class RegisterRequest(BaseModel):
     email: str
@@ -125,7 +286,6 @@ async def save_file(file: UploadFile, file_path: str) -> None:
 
 @app.post("/analyze", response_model=DocumentResponse)
 async def upload_and_analyze(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     query: str = Form(default="Analyze this financial document for investment insights"),
     current_user: UserModel = Depends(get_current_user),
@@ -141,7 +301,10 @@ async def upload_and_analyze(
         "content_type": file.content_type,
         "path": file_path,
         "user_id": str(current_user.id),
-        "status": "uploaded",
+        "query": query,
+        "role": current_user.role,
+        "status": "queued",
+        "owner": PROCESS_ID,
         "created_at": {"$currentDate": True}
     }
 
@@ -152,27 +315,46 @@ async def upload_and_analyze(
         await aiofiles.os.remove(file_path)
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
-    background_tasks.add_task(
+    queue_info = scheduler.submit(
+        document_id,
+        str(current_user.id),
         analyze_document_and_save,
         document_id,
         file_path,
         query,
-        str(current_user.id)
-    )
+        str(current_user.id),
+        role=current_user.role,
+    ) or {}
 
     return DocumentResponse(
         status="queued",
         document_id=document_id,
-        message="Document uploaded successfully and queued for analysis"
+        message="Document uploaded successfully and queued for analysis",
+        **queue_info
+    )
+
+@app.get("/analyses/{document_id}", responses={200: {"model": List[AnalysisResponse]}})
+async def get_analyses(
+    document_id: str,
+    view: str = "full",
+    fields: Optional[str] = None,
+    exclude: Optional[str] = None,
+    current_user: UserModel = Depends(get_current_user)
+):
+    if view not in ("full", "summary"):
+        raise HTTPException(status_code=400, detail="view must be 'full' or 'summary'")
+    projection = build_projection(
+        ANALYSIS_FIELDS,
+        fields,
+        exclude,
+        default_exclude=ANALYSIS_SUMMARY_EXCLUDE if view == "summary" else None,
     )
 
-@app.get("/analyses/{document_id}", response_model=List[AnalysisResponse])
-async def get_analyses(document_id: str, current_user: UserModel = Depends(get_current_user)):
     query = {"document_id": document_id}
     if current_user.role != "admin":
         query["user_id"] = str(current_user.id)
 
-    cursor = db.analyses.find(query).sort("created_at", -1)
+    cursor = db.analyses.find(query, projection or None).sort("created_at", -1)
     analyses = []
     async for doc in cursor:
         analyses.append(convert_objectids(doc, ["_id", "user_id"]))
@@ -180,20 +362,191 @@ async def get_analyses(document_id: str, current_user: UserModel = Depends(get_c
     if not analyses:
         raise HTTPException(status_code=404, detail="No analyses found")
     
-    return analyses
+    # Documents come straight from Mongo, so skip response_model validation
+    return ORJSONResponse(analyses)
+
+@app.get("/analyses/{document_id}/stream")
+async def stream_analysis(document_id: str, current_user: UserModel = Depends(get_current_user)):
+    doc = await db.documents.find_one(
+        {
+            "_id": ObjectId(document_id),
+            **({} if current_user.role == "admin" else {"user_id": str(current_user.id)})
+        },
+        {"_id": 1}
+    )
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return StreamingResponse(
+        stream_events(document_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.get("/documents")
 async def list_documents(
     skip: int = 0,
     limit: int = 20,
+    fields: Optional[str] = None,
+    exclude: Optional[str] = None,
     current_user: UserModel = Depends(get_current_user)
 ):
+    projection = build_projection(DOCUMENT_FIELDS, fields, exclude, default_exclude=DOCUMENT_DEFAULT_EXCLUDE)
+    if fields and "status" not in projection:
+        projection["status"] = 1  # needed to attach queue info
     query = {} if current_user.role == "admin" else {"user_id": str(current_user.id)}
-    cursor = db.documents.find(query).skip(skip).limit(limit).sort("created_at", -1)
+    cursor = db.documents.find(query, projection or None).skip(skip).limit(limit).sort("created_at", -1)
     documents = await cursor.to_list(length=limit)
     documents = [convert_objectids(doc, ["_id", "user_id"]) for doc in documents]
+    for doc in documents:
+        if doc.get("status") == "queued":
+            doc.update(scheduler.queue_info(doc["_id"]) or {})
     total = await db.documents.count_documents(query)
-    return {"documents": documents, "total": total}
+    return ORJSONResponse({"documents": documents, "total": total})
+
+@app.get("/documents/{document_id}/status")
+async def get_document_status(
+    document_id: str,
+    current_user: UserModel = Depends(get_current_user)
+):
+    doc = await db.documents.find_one(
+        {
+            "_id": ObjectId(document_id),
+            **({} if current_user.role == "admin" else {"user_id": str(current_user.id)})
+        },
+        {"status": 1, "error": 1}
+    )
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+    status = {"document_id": document_id, "status": doc["status"], "error": doc.get("error")}
+    status.update(scheduler.queue_info(document_id) or {})
+    return status
+
+# ----------------------- Statement Endpoints ----------------------- #
+def statement_scope(current_user: UserModel) -> Optional[str]:
+    return None if current_user.role == "admin" else str(current_user.id)
+
+# Store reads take a lock shared with appends, so keep them off the event loop
+@app.get("/statements/metrics")
+async def list_statement_metrics(current_user: UserModel = Depends(get_current_user)):
+    return await asyncio.to_thread(statement_store.metrics, user_id=statement_scope(current_user))
+
+@app.get("/statements/series")
+async def statement_series(
+    metric: str,
+    unit: Optional[str] = None,
+    document_id: Optional[List[str]] = Query(default=None),
+    current_user: UserModel = Depends(get_current_user)
+):
+    try:
+        return await asyncio.to_thread(
+            statement_store.series,
+            normalize_metric(metric),
+            user_id=statement_scope(current_user),
+            document_ids=document_id,
+            unit=unit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/statements/aggregate")
+async def statement_aggregate(
+    metric: str,
+    group_by: str = "period",
+    agg: str = "sum",
+    unit: Optional[str] = None,
+    document_id: Optional[List[str]] = Query(default=None),
+    current_user: UserModel = Depends(get_current_user)
+):
+    try:
+        return await asyncio.to_thread(
+            statement_store.aggregate,
+            normalize_metric(metric),
+            group_by=group_by,
+            agg=agg,
+            user_id=statement_scope(current_user),
+            document_ids=document_id,
+            unit=unit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/stats")
+async def usage_stats(
+    days: int = 30,
+    user_id: Optional[str] = None,
+    current_user: UserModel = Depends(get_current_user)
+):
+    if not 1 <= days <= 366:
+        raise HTTPException(status_code=400, detail="days must be between 1 and 366")
+    if current_user.role == "admin":
+        target = user_id or ALL_USERS
+    elif user_id and user_id != str(current_user.id):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    else:
+        target = str(current_user.id)
+    return await get_stats(target, days)
+
+@app.get("/scheduler")
+async def scheduler_stats(current_user: UserModel = Depends(require_admin)):
+    return scheduler.stats()
+
+# ----------------------- Profiling (admin) ----------------------- #
+class LoopMonitorRequest(BaseModel):
+    enabled: bool
+    threshold_ms: Optional[float] = None
+
+@app.post("/admin/profiles")
+async def start_profile(seconds: float = 30, current_user: UserModel = Depends(require_admin)):
+    if seconds <= 0:
+        raise HTTPException(status_code=400, detail="seconds must be positive")
+    return start_timed_profile(seconds).info()
+
+@app.post("/admin/profiles/documents/{document_id}")
+async def profile_document(document_id: str, current_user: UserModel = Depends(require_admin)):
+    return arm_document_profile(document_id).info()
+
+@app.get("/admin/profiles")
+async def list_profiles(current_user: UserModel = Depends(require_admin)):
+    return [p.info() for p in reversed(profiles.values())]
+
+@app.get("/admin/profiles/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    format: str = "summary",
+    current_user: UserModel = Depends(require_admin)
+):
+    profiler = profiles.get(profile_id)
+    if not profiler:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "folded":
+        return PlainTextResponse(
+            profiler.folded(),
+            headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'},
+        )
+    if format != "summary":
+        raise HTTPException(status_code=400, detail="format must be 'summary' or 'folded'")
+    return {**profiler.info(), "top_functions": profiler.top_functions()}
+
+@app.get("/admin/loop-monitor")
+async def get_loop_monitor(current_user: UserModel = Depends(require_admin)):
+    return {
+        "enabled": loop_monitor.running,
+        "threshold_ms": loop_monitor.threshold_ms,
+        "events": list(loop_monitor.events),
+    }
+
+@app.post("/admin/loop-monitor")
+async def set_loop_monitor(req: LoopMonitorRequest, current_user: UserModel = Depends(require_admin)):
+    if req.threshold_ms is not None:
+        if req.threshold_ms <= 0:
+            raise HTTPException(status_code=400, detail="threshold_ms must be positive")
+        await loop_monitor.stop()
+        loop_monitor.threshold_ms = req.threshold_ms
+    if req.enabled:
+        loop_monitor.start()
+    else:
+        await loop_monitor.stop()
+    return {"enabled": loop_monitor.running, "threshold_ms": loop_monitor.threshold_ms}
 
 @app.delete("/documents/{document_id}")
 async def delete_document(
@@ -206,10 +559,14 @@ async def delete_document(
     })
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
+    # Worker threads of a cancelled run may outlive its task; the store
+    # ignores their late appends once the document is deleted there
+    await scheduler.cancel_and_wait(document_id)
     if os.path.exists(doc["path"]):
         await aiofiles.os.remove(doc["path"])
     await db.documents.delete_one({"_id": ObjectId(document_id)})
     await db.analyses.delete_many({"document_id": document_id})
+    await statement_store.delete(document_id)
     return {"message": "Document deleted successfully"}
 
 @app.get("/health")
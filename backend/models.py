@@ -33,6 +33,9 @@ class DocumentResponse(BaseModel):
     status: str
     document_id: str
     message: Optional[str] = None
+    queue_position: Optional[int] = None
+    estimated_start_at: Optional[datetime] = None
+    lane: Optional[str] = None
 
 class AnalysisResponse(BaseModel):
     document_id: str
@@ -0,0 +1,278 @@
+# profiling.py
+import os
+import sys
+import time
+import uuid
+import asyncio
+import logging
+import threading
+import functools
+import traceback
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Set
+
+logger = logging.getLogger(__name__)
+
+# ---------------- Config ---------------- #
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", "300"))
+PROFILE_MAX_STORED = int(os.getenv("PROFILE_MAX_STORED", "20"))
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "false").lower() == "true"
+LOOP_LAG_THRESHOLD_MS = float(os.getenv("LOOP_LAG_THRESHOLD_MS", "100"))
+
+# Leaf frames of threads that are just parked (event loop selector, idle pool workers)
+IDLE_LEAVES = {("selectors.py", "select"), ("threading.py", "wait"), ("thread.py", "_worker")}
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+def _fold_stack(frame, thread_name: str) -> Optional[str]:
+    """Collapse a frame chain into flamegraph 'folded' form, root first."""
+    leaf = frame.f_code
+    if (os.path.basename(leaf.co_filename), leaf.co_name) in IDLE_LEAVES:
+        return None
+    parts = []
+    while frame is not None:
+        parts.append(_frame_label(frame))
+        frame = frame.f_back
+    parts.append(thread_name)
+    return ";".join(reversed(parts))
+
+# ---------------- Sampling profiler ---------------- #
+class SamplingProfiler:
+    """
+    Statistical profiler that samples thread stacks from a background
+    thread. Nothing is installed on the profiled code, so there is no cost
+    unless a profile is running.
+
+    A timed profile samples every thread. A document profile samples only
+    the event loop thread and the worker threads its run enters through
+    ``profiling.to_thread``; the loop thread is shared, so ``info()`` also
+    reports how many analyses ran alongside it.
+    """
+
+    def __init__(self, label: str, duration_s: Optional[float] = None, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.id = uuid.uuid4().hex[:12]
+        self.label = label
+        self.duration_s = duration_s
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stacks_lock = threading.Lock()
+        self.samples = 0
+        self.started_at: Optional[datetime] = None
+        self.ended_at: Optional[datetime] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # None samples every thread; a set restricts sampling to those idents
+        self.threads: Optional[Set[int]] = None
+        self.peak_active_runs = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> "SamplingProfiler":
+        self.started_at = datetime.utcnow()
+        self._thread = threading.Thread(target=self._run, name=f"profiler-{self.id}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    @contextmanager
+    def track_thread(self):
+        """Include the calling thread in a restricted profile while the block runs."""
+        tid = threading.get_ident()
+        with self._stacks_lock:
+            if self.threads is not None:
+                self.threads.add(tid)
+        try:
+            yield
+        finally:
+            with self._stacks_lock:
+                if self.threads is not None:
+                    self.threads.discard(tid)
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        deadline = time.monotonic() + self.duration_s if self.duration_s else None
+        try:
+            while not self._stop.wait(self.interval):
+                if deadline and time.monotonic() >= deadline:
+                    break
+                with self._stacks_lock:
+                    threads = None if self.threads is None else set(self.threads)
+                names = {t.ident: t.name for t in threading.enumerate()}
+                folded = [
+                    _fold_stack(frame, names.get(tid, str(tid)))
+                    for tid, frame in sys._current_frames().items()
+                    if tid != me and (threads is None or tid in threads)
+                ]
+                with self._stacks_lock:
+                    self.stacks.update(stack for stack in folded if stack)
+                    self.samples += 1
+                    self.peak_active_runs = max(self.peak_active_runs, _active_runs)
+        finally:
+            self.ended_at = datetime.utcnow()
+
+    def _stacks_snapshot(self) -> Counter:
+        # The sampler thread keeps adding stacks while a profile runs
+        with self._stacks_lock:
+            return self.stacks.copy()
+
+    def folded(self) -> str:
+        """Stacks in folded format, loadable by flamegraph.pl or speedscope."""
+        return "\n".join(f"{stack} {count}" for stack, count in self._stacks_snapshot().most_common())
+
+    def top_functions(self, limit: int = 20) -> List[Dict[str, Any]]:
+        leaves: Counter = Counter()
+        for stack, count in self._stacks_snapshot().items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [
+            {"function": name, "samples": count, "percent": round(100 * count / total, 2)}
+            for name, count in leaves.most_common(limit)
+        ]
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "label": self.label,
+            "running": self.running,
+            "samples": self.samples,
+            "threads": "all" if self.threads is None else "run",
+            # Analyses in progress at once, this one included; above 1 the
+            # event loop samples also contain the other runs' work
+            "peak_active_runs": self.peak_active_runs,
+            "started_at": self.started_at,
+            "ended_at": self.ended_at,
+        }
+
+profiles: "OrderedDict[str, SamplingProfiler]" = OrderedDict()
+_armed_documents: Dict[str, str] = {}
+# Document runs currently inside profiled_by_document, profiled or not
+_active_runs = 0
+# Profile of the document run in this context; to_thread copies it to workers
+current_profiler: ContextVar[Optional[SamplingProfiler]] = ContextVar("current_profiler", default=None)
+
+def _store(profiler: SamplingProfiler) -> SamplingProfiler:
+    profiles[profiler.id] = profiler
+    while len(profiles) > PROFILE_MAX_STORED:
+        profiles.popitem(last=False)
+    return profiler
+
+def start_timed_profile(seconds: float) -> SamplingProfiler:
+    seconds = min(seconds, PROFILE_MAX_SECONDS)
+    return _store(SamplingProfiler(f"timed {seconds:g}s", duration_s=seconds).start())
+
+def arm_document_profile(document_id: str) -> SamplingProfiler:
+    """Profile the next analyze_document_and_save run for this document."""
+    profiler = _store(SamplingProfiler(f"document {document_id}", duration_s=PROFILE_MAX_SECONDS))
+    _armed_documents[document_id] = profiler.id
+    return profiler
+
+def profiled_by_document(func):
+    """Run the wrapped coroutine under a profiler when its document_id is armed."""
+    @functools.wraps(func)
+    async def wrapper(document_id: str, *args, **kwargs):
+        global _active_runs
+        _active_runs += 1
+        try:
+            profile_id = _armed_documents.pop(document_id, None) if _armed_documents else None
+            profiler = profiles.get(profile_id) if profile_id else None
+            if profiler is None:
+                return await func(document_id, *args, **kwargs)
+            # Sample this run only: the loop thread plus workers it registers
+            profiler.threads = {threading.get_ident()}
+            token = current_profiler.set(profiler)
+            profiler.start()
+            try:
+                return await func(document_id, *args, **kwargs)
+            finally:
+                current_profiler.reset(token)
+                await asyncio.to_thread(profiler.stop)
+        finally:
+            _active_runs -= 1
+    return wrapper
+
+def _call_tracked(func, *args, **kwargs):
+    profiler = current_profiler.get()
+    if profiler is None:
+        return func(*args, **kwargs)
+    with profiler.track_thread():
+        return func(*args, **kwargs)
+
+async def to_thread(func, *args, **kwargs):
+    """asyncio.to_thread whose worker thread is sampled by the current document profile."""
+    return await asyncio.to_thread(_call_tracked, func, *args, **kwargs)
+
+# ---------------- Event loop lag monitor ---------------- #
+class LoopLagMonitor:
+    """
+    Detects callbacks that block the event loop. A coroutine on the loop
+    refreshes a heartbeat; a watchdog thread notices when it goes stale and
+    logs the loop thread's stack at that moment (e.g. bcrypt or pypdf).
+    """
+
+    def __init__(self, threshold_ms: float = LOOP_LAG_THRESHOLD_MS):
+        self.threshold_ms = threshold_ms
+        self.events: deque = deque(maxlen=100)
+        self._beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(f"Event loop lag monitor started (threshold {self.threshold_ms}ms)")
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._watchdog:
+            await asyncio.to_thread(self._watchdog.join)
+        self._task = None
+        self._watchdog = None
+
+    async def _heartbeat(self) -> None:
+        interval = self.threshold_ms / 2000
+        while True:
+            self._beat = time.monotonic()
+            await asyncio.sleep(interval)
+
+    def _watch(self) -> None:
+        interval = self.threshold_ms / 2000
+        reported_beat = None
+        while not self._stop.wait(interval):
+            beat = self._beat
+            lag_ms = (time.monotonic() - beat) * 1000 - self.threshold_ms / 2
+            if lag_ms < self.threshold_ms or beat == reported_beat:
+                continue
+            reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else ""
+            self.events.append({"at": datetime.utcnow(), "lag_ms": round(lag_ms, 1), "stack": stack})
+            logger.warning(f"Event loop blocked for >{lag_ms:.0f}ms at:\n{stack}")
+
+loop_monitor = LoopLagMonitor()
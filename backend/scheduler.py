@@ -0,0 +1,216 @@
+# scheduler.py
+import os
+import asyncio
+import logging
+import itertools
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Callable, Awaitable
+
+logger = logging.getLogger(__name__)
+
+# ---------------- Config ---------------- #
+MAX_CONCURRENT_ANALYSES = int(os.getenv("MAX_CONCURRENT_ANALYSES", "4"))
+MAX_ANALYSES_PER_USER = int(os.getenv("MAX_ANALYSES_PER_USER", "2"))
+# A user with this many jobs already waiting is considered a bulk uploader
+BULK_QUEUE_THRESHOLD = int(os.getenv("BULK_QUEUE_THRESHOLD", "3"))
+# Initial guess for the duration of one analysis, refined as jobs complete
+DEFAULT_JOB_SECONDS = float(os.getenv("DEFAULT_JOB_SECONDS", "120"))
+
+# Lanes are served strictly in this order; fair queuing applies within a lane
+LANE_INTERACTIVE = "interactive"
+LANE_BULK = "bulk"
+LANES = [LANE_INTERACTIVE, LANE_BULK]
+
+ROLE_WEIGHTS = {"admin": 2.0, "viewer": 1.0}
+
+# ---------------- Job ---------------- #
+@dataclass
+class Job:
+    document_id: str
+    user_id: str
+    lane: str
+    start_tag: float
+    finish_tag: float
+    seq: int
+    func: Callable[..., Awaitable[Any]]
+    args: tuple = ()
+    enqueued_at: datetime = field(default_factory=datetime.utcnow)
+
+    def sort_key(self):
+        return (LANES.index(self.lane), self.finish_tag, self.seq)
+
+# ---------------- Scheduler ---------------- #
+class AnalysisScheduler:
+    """
+    In-process scheduler for background analyses.
+
+    Jobs are split into priority lanes (interactive ahead of bulk). Within a
+    lane, users are served by weighted fair queuing: each job gets a virtual
+    finish tag of ``max(vtime, user's last tag) + 1 / weight`` and the smallest
+    tag runs next, so a user with 500 queued files only gets their fair share.
+    Each user is also capped at ``max_per_user`` running jobs.
+
+    State is per process: with several backend processes, every one has its
+    own queue and caps, and a document belongs to the process that queued it.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = MAX_CONCURRENT_ANALYSES,
+        max_per_user: int = MAX_ANALYSES_PER_USER,
+    ):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_per_user = max(1, max_per_user)
+        self._pending: List[Job] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._running_per_user: Dict[str, int] = {}
+        self._user_tags: Dict[str, float] = {}
+        self._vtime = 0.0
+        self._seq = itertools.count()
+        self._avg_job_seconds = DEFAULT_JOB_SECONDS
+
+    # ---------------- Submission ---------------- #
+    def submit(
+        self,
+        document_id: str,
+        user_id: str,
+        func: Callable[..., Awaitable[Any]],
+        *args,
+        role: str = "viewer",
+        lane: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Queue a job and return its initial queue info."""
+        if lane is None:
+            lane = self._classify(user_id, role)
+        elif lane not in LANES:
+            raise ValueError(f"Unknown lane: {lane}")
+
+        weight = ROLE_WEIGHTS.get(role, 1.0)
+        start_tag = max(self._vtime, self._user_tags.get(user_id, 0.0))
+        finish_tag = start_tag + 1.0 / weight
+        self._user_tags[user_id] = finish_tag
+
+        self._pending.append(Job(
+            document_id=document_id,
+            user_id=user_id,
+            lane=lane,
+            start_tag=start_tag,
+            finish_tag=finish_tag,
+            seq=next(self._seq),
+            func=func,
+            args=args,
+        ))
+        self._dispatch()
+        return self.queue_info(document_id)
+
+    def _classify(self, user_id: str, role: str) -> str:
+        if role == "admin":
+            return LANE_INTERACTIVE
+        waiting = sum(1 for job in self._pending if job.user_id == user_id)
+        return LANE_BULK if waiting >= BULK_QUEUE_THRESHOLD else LANE_INTERACTIVE
+
+    # ---------------- Dispatch ---------------- #
+    def _dispatch(self) -> None:
+        while len(self._running) < self.max_concurrent:
+            job = self._next_job()
+            if job is None:
+                return
+            self._pending.remove(job)
+            self._vtime = max(self._vtime, job.start_tag)
+            self._running_per_user[job.user_id] = self._running_per_user.get(job.user_id, 0) + 1
+            task = asyncio.create_task(self._run(job))
+            self._running[job.document_id] = task
+
+    def _next_job(self) -> Optional[Job]:
+        eligible = [
+            job for job in self._pending
+            if self._running_per_user.get(job.user_id, 0) < self.max_per_user
+        ]
+        if not eligible:
+            return None
+        return min(eligible, key=Job.sort_key)
+
+    async def _run(self, job: Job) -> None:
+        started = datetime.utcnow()
+        try:
+            await job.func(*job.args)
+        except Exception as e:
+            logger.error(f"Scheduled analysis {job.document_id} failed: {e}", exc_info=True)
+        finally:
+            elapsed = (datetime.utcnow() - started).total_seconds()
+            self._avg_job_seconds = 0.8 * self._avg_job_seconds + 0.2 * elapsed
+            self._running.pop(job.document_id, None)
+            remaining = self._running_per_user.get(job.user_id, 1) - 1
+            if remaining > 0:
+                self._running_per_user[job.user_id] = remaining
+            else:
+                self._running_per_user.pop(job.user_id, None)
+                if not any(j.user_id == job.user_id for j in self._pending):
+                    self._user_tags.pop(job.user_id, None)
+            self._dispatch()
+
+    # ---------------- Introspection ---------------- #
+    def queue_info(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Return queue position and estimated start time, or None if unknown."""
+        if document_id in self._running:
+            return {"queue_position": 0, "estimated_start_at": None, "lane": None}
+
+        ordered = sorted(self._pending, key=Job.sort_key)
+        for position, job in enumerate(ordered, start=1):
+            if job.document_id == document_id:
+                waves = (len(self._running) + position - 1) // self.max_concurrent
+                eta = datetime.utcnow() + timedelta(seconds=waves * self._avg_job_seconds)
+                return {
+                    "queue_position": position,
+                    "estimated_start_at": eta,
+                    "lane": job.lane,
+                }
+        return None
+
+    def cancel(self, document_id: str) -> bool:
+        """Drop a pending job or cancel a running one."""
+        for job in self._pending:
+            if job.document_id == document_id:
+                self._pending.remove(job)
+                return True
+        task = self._running.get(document_id)
+        if task:
+            task.cancel()
+            return True
+        return False
+
+    async def cancel_and_wait(self, document_id: str) -> bool:
+        """Like cancel, but return only once a running job's task has unwound."""
+        task = self._running.get(document_id)
+        cancelled = self.cancel(document_id)
+        if task:
+            await asyncio.gather(task, return_exceptions=True)
+        return cancelled
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": len(self._running),
+            "pending": len(self._pending),
+            "pending_by_lane": {
+                lane: sum(1 for job in self._pending if job.lane == lane) for lane in LANES
+            },
+            "avg_job_seconds": round(self._avg_job_seconds, 2),
+        }
+
+    async def shutdown(self) -> List[str]:
+        """
+        Cancel running jobs and drop the in-memory queue. Returns the
+        document ids that did not finish so the caller can keep them
+        recoverable; queued documents are re-submitted on next startup.
+        """
+        dropped = [job.document_id for job in self._pending] + list(self._running)
+        self._pending.clear()
+        tasks = list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return dropped
+
+
+scheduler = AnalysisScheduler()
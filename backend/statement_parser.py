@@ -0,0 +1,126 @@
+# statement_parser.py
+import re
+from typing import Optional
+
+STATEMENT_HINTS = (
+    "balance sheet", "income statement", "statement of operations", "statements of operations",
+    "statement of income", "statements of income", "cash flows", "financial position",
+    "comprehensive income",
+)
+YEAR_RE = re.compile(r"\b(?:FY\s?)?((?:19|20)\d{2})\b")
+# Two or more fiscal-year tokens ending the line
+YEAR_RUN_RE = re.compile(r"((?:(?:FY\s?)?(?:19|20)\d{2}\s*){2,})$")
+# Text allowed before the years on a header line, e.g. "For the years ended December 31,"
+HEADER_PREFIX_RE = re.compile(
+    r"^(?:for\s+the\s+)?(?:fiscal\s+)?"
+    r"(?:(?:years?|quarters?|periods?|(?:three|six|nine|twelve)\s+months)(?:\s+end(?:ed|ing))?\s*)?"
+    r"(?:as\s+(?:of|at)\s*)?"
+    r"(?:(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?\s+\d{1,2},?)?$",
+    re.IGNORECASE,
+)
+VALUE_RE = re.compile(r"^\(?-?\$?\d[\d,]*(?:\.\d+)?\)?$|^[—–-]{1,2}$")
+SCALE_RE = re.compile(r"in\s+(thousands|millions|billions)", re.IGNORECASE)
+SCALES = {"units": 1.0, "thousands": 1e3, "millions": 1e6, "billions": 1e9}
+METRIC_ALIASES = {
+    "revenues": "revenue",
+    "total revenue": "revenue",
+    "total revenues": "revenue",
+    "net sales": "revenue",
+    "total net sales": "revenue",
+    "net income (loss)": "net income",
+    "net earnings": "net income",
+    "total stockholders' equity": "total equity",
+    "total shareholders' equity": "total equity",
+}
+
+# Self-describing metrics that keep their name inside a sub-header scope
+CANONICAL_METRICS = set(METRIC_ALIASES.values())
+
+def normalize_metric(label: str) -> str:
+    """Canonical metric name for a statement line label."""
+    metric = re.sub(r"\s+", " ", label.strip(" .:$")).lower()
+    return METRIC_ALIASES.get(metric, metric)
+
+def _parse_value(token: str) -> Optional[float]:
+    token = token.replace("$", "").replace(",", "")
+    if not token or token.strip("-—–") == "":
+        return None
+    negative = token.startswith("(") and token.endswith(")")
+    value = float(token.strip("()"))
+    return -value if negative else value
+
+def _row_unit(metric: str, scale: float, currency: str) -> tuple[float, str]:
+    """Scale factor and unit for a row; per-share amounts and share counts are never scaled."""
+    # "Shares used in computing earnings per share" is a share count, not an amount
+    if re.search(r"\bshares\b", metric):
+        return 1.0, "shares"
+    if "per share" in metric:
+        return 1.0, f"{currency}/share"
+    return scale, currency
+
+def _header_periods(line: str) -> Optional[list[int]]:
+    """Fiscal years of a column header line, or None if the line is not one."""
+    line = line.strip()
+    years = YEAR_RUN_RE.search(line)
+    if not years or not HEADER_PREFIX_RE.match(line[:years.start()].strip()):
+        return None
+    return [int(y) for y in YEAR_RE.findall(years.group(1))]
+
+def parse_statement_page(page_text: str) -> list[dict]:
+    """
+    Extract (period, metric, value, unit) line items from one page of a
+    financial statement. A header line of fiscal years, optionally after a
+    period phrase such as "Year ended December 31,", sets the columns;
+    following lines ending in that many numbers become rows.
+
+    Values are scaled to base units using the page's "in thousands/millions"
+    note, so unit is "USD" (or "units" without a currency sign). A label-only
+    line ending in ":" (e.g. "Earnings per share:") prefixes the metrics of
+    the rows under it until the next such line or a "Total ..." row. Per-share
+    amounts ("/share") and share counts ("shares") are never scaled.
+    """
+    lowered = page_text.lower()
+    if not any(hint in lowered for hint in STATEMENT_HINTS):
+        return []
+
+    scale_match = SCALE_RE.search(page_text)
+    scale = SCALES[scale_match.group(1).lower()] if scale_match else 1.0
+    currency = "USD" if "$" in page_text else "units"
+
+    rows = []
+    periods: list[int] = []
+    section: Optional[str] = None
+    for line in page_text.splitlines():
+        header = _header_periods(line)
+        if header:
+            periods = header
+            section = None
+            continue
+        if not periods:
+            continue
+
+        tokens = [t for t in line.split() if t != "$"]
+        values = []
+        while tokens and VALUE_RE.match(tokens[-1]):
+            values.insert(0, tokens.pop())
+        label = " ".join(tokens)
+        if not values:
+            # "Earnings per share:" scopes the rows below it; other text ends a scope
+            section = normalize_metric(label) if label.endswith(":") else None
+            continue
+        if len(values) != len(periods) or not re.search(r"[A-Za-z]", label) or len(label) > 80:
+            continue
+
+        metric = normalize_metric(label)
+        closes_section = metric.startswith("total")
+        if section and not closes_section and metric not in CANONICAL_METRICS:
+            metric = f"{section}: {metric}"
+        if closes_section:
+            section = None
+
+        value_scale, unit = _row_unit(metric, scale, currency)
+        for period, token in zip(periods, values):
+            value = _parse_value(token)
+            if value is not None:
+                rows.append({"period": period, "metric": metric, "value": value * value_scale, "unit": unit})
+    return rows
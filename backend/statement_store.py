@@ -0,0 +1,363 @@
+# statement_store.py
+import os
+import json
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Set
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: only safe with a single writer process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# ---------------- Config ---------------- #
+STATEMENTS_DIR = os.getenv(
+    "STATEMENTS_DIR", os.path.join(os.getenv("UPLOAD_DIR", "data"), "statements")
+)
+
+# One raw little-endian file per column; string columns hold dictionary codes
+COLUMNS = {
+    "document_id": np.dtype("<i4"),
+    "user_id": np.dtype("<i4"),
+    "period": np.dtype("<i4"),
+    "metric": np.dtype("<i4"),
+    "value": np.dtype("<f8"),
+    "unit": np.dtype("<i4"),
+}
+DICTIONARY_COLUMNS = ("document_id", "user_id", "metric", "unit")
+AGGREGATIONS = ("sum", "mean", "min", "max", "count")
+GROUP_BY = ("period", "document_id")
+
+class MixedUnitsError(ValueError):
+    """Raised when a query would combine values stored in different units."""
+
+class StatementStore:
+    """
+    Append-only columnar store of financial statement line items.
+
+    Each column lives in its own ``<column>.bin`` file and is read through
+    ``np.memmap``. ``meta.json`` holds the committed row count and the string
+    dictionaries; it is rewritten atomically after the column files, so a
+    crash mid-append leaves only uncommitted bytes that the next append
+    truncates. Re-analysing or deleting a document hides its older rows via a
+    per-document row cutoff rather than rewriting the files; deleted document
+    ids are also remembered so a run still in flight cannot append them again.
+
+    Writers from several worker processes are serialised with an flock on
+    ``.lock`` and reload meta.json under it; readers reload it whenever it
+    changed on disk. Values are stored in base units (see statement_parser),
+    and aggregating across different units is refused.
+    """
+
+    def __init__(self, directory: str = STATEMENTS_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._mmaps: Optional[Dict[str, np.ndarray]] = None
+        self._cutoff_array: Optional[np.ndarray] = None
+        self._meta_stamp = None
+        os.makedirs(directory, exist_ok=True)
+        self._load_meta()
+
+    # ---------------- Metadata ---------------- #
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.directory, "meta.json")
+
+    @property
+    def _lock_path(self) -> str:
+        return os.path.join(self.directory, ".lock")
+
+    def _column_path(self, column: str) -> str:
+        return os.path.join(self.directory, f"{column}.bin")
+
+    def _stat_meta(self):
+        try:
+            st = os.stat(self._meta_path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _load_meta(self) -> None:
+        meta = {}
+        self._meta_stamp = self._stat_meta()
+        if self._meta_stamp is not None:
+            with open(self._meta_path) as f:
+                meta = json.load(f)
+        self.rows: int = meta.get("rows", 0)
+        self.dictionaries: Dict[str, List[str]] = {
+            col: meta.get("dictionaries", {}).get(col, []) for col in DICTIONARY_COLUMNS
+        }
+        # document code -> first visible row for that document
+        self.cutoffs: Dict[str, int] = meta.get("cutoffs", {})
+        self.deleted: Set[str] = set(meta.get("deleted", []))
+        self._codes = {
+            col: {name: code for code, name in enumerate(names)}
+            for col, names in self.dictionaries.items()
+        }
+
+    def _save_meta(self) -> None:
+        tmp_path = self._meta_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "rows": self.rows,
+                "dictionaries": self.dictionaries,
+                "cutoffs": self.cutoffs,
+                "deleted": sorted(self.deleted),
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._meta_path)
+        self._meta_stamp = self._stat_meta()
+
+    def _refresh(self) -> None:
+        """Reload meta.json if another process committed since we read it. Hold _lock."""
+        if self._stat_meta() != self._meta_stamp:
+            self._load_meta()
+            self._mmaps = None
+            self._cutoff_array = None
+
+    @contextmanager
+    def _reading(self):
+        with self._lock:
+            self._refresh()
+            yield
+
+    @contextmanager
+    def _writing(self):
+        with self._lock:
+            with open(self._lock_path, "a") as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._refresh()
+                    yield
+                finally:
+                    if fcntl:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _encode(self, column: str, value: str) -> int:
+        codes = self._codes[column]
+        if value not in codes:
+            codes[value] = len(self.dictionaries[column])
+            self.dictionaries[column].append(value)
+        return codes[value]
+
+    # ---------------- Writes ---------------- #
+    def append_sync(self, document_id: str, user_id: Optional[str], items: List[dict]) -> int:
+        """Append a document's line items, superseding any earlier rows for it."""
+        with self._writing():
+            if document_id in self.deleted:
+                logger.info(f"Skipping statement rows for deleted document {document_id}")
+                return 0
+            existing = document_id in self._codes["document_id"]
+            doc_code = self._encode("document_id", document_id)
+            if existing:
+                self.cutoffs[str(doc_code)] = self.rows
+
+            if items:
+                user_code = self._encode("user_id", user_id or "anonymous")
+                columns = {
+                    "document_id": np.full(len(items), doc_code, dtype=COLUMNS["document_id"]),
+                    "user_id": np.full(len(items), user_code, dtype=COLUMNS["user_id"]),
+                    "period": np.array([i["period"] for i in items], dtype=COLUMNS["period"]),
+                    "metric": np.array([self._encode("metric", i["metric"]) for i in items], dtype=COLUMNS["metric"]),
+                    "value": np.array([i["value"] for i in items], dtype=COLUMNS["value"]),
+                    "unit": np.array([self._encode("unit", i["unit"]) for i in items], dtype=COLUMNS["unit"]),
+                }
+                for column, array in columns.items():
+                    path = self._column_path(column)
+                    with open(path, "ab") as f:
+                        # Drop bytes from an append that never committed
+                        f.truncate(self.rows * COLUMNS[column].itemsize)
+                        f.write(array.tobytes())
+                        f.flush()
+                        os.fsync(f.fileno())
+                self.rows += len(items)
+
+            self._save_meta()
+            self._mmaps = None
+            self._cutoff_array = None
+            return len(items)
+
+    def delete_sync(self, document_id: str) -> None:
+        with self._writing():
+            self.deleted.add(document_id)
+            code = self._codes["document_id"].get(document_id)
+            if code is not None:
+                self.cutoffs[str(code)] = self.rows
+            self._save_meta()
+            self._cutoff_array = None
+
+    async def append(self, document_id: str, user_id: Optional[str], items: List[dict]) -> int:
+        return await asyncio.to_thread(self.append_sync, document_id, user_id, items)
+
+    async def delete(self, document_id: str) -> None:
+        await asyncio.to_thread(self.delete_sync, document_id)
+
+    # ---------------- Reads ---------------- #
+    def _columns(self) -> Dict[str, np.ndarray]:
+        mmaps = self._mmaps
+        if mmaps is None:
+            if self.rows == 0:
+                mmaps = {col: np.empty(0, dtype=dtype) for col, dtype in COLUMNS.items()}
+            else:
+                mmaps = {
+                    col: np.memmap(self._column_path(col), dtype=dtype, mode="r", shape=(self.rows,))
+                    for col, dtype in COLUMNS.items()
+                }
+            self._mmaps = mmaps
+        return mmaps
+
+    def _mask(
+        self,
+        cols: Dict[str, np.ndarray],
+        metric: str,
+        user_id: Optional[str] = None,
+        document_ids: Optional[List[str]] = None,
+        unit: Optional[str] = None,
+    ) -> np.ndarray:
+        n = len(cols["metric"])
+        metric_code = self._codes["metric"].get(metric)
+        if metric_code is None:
+            return np.zeros(n, dtype=bool)
+        mask = cols["metric"] == metric_code
+
+        if user_id is not None:
+            user_code = self._codes["user_id"].get(user_id)
+            if user_code is None:
+                return np.zeros(n, dtype=bool)
+            mask &= cols["user_id"] == user_code
+
+        if unit is not None:
+            unit_code = self._codes["unit"].get(unit)
+            if unit_code is None:
+                return np.zeros(n, dtype=bool)
+            mask &= cols["unit"] == unit_code
+
+        if document_ids:
+            codes = [self._codes["document_id"][d] for d in document_ids if d in self._codes["document_id"]]
+            mask &= np.isin(cols["document_id"], codes)
+
+        return mask & self._visible(cols)
+
+    def _visible(self, cols: Dict[str, np.ndarray]) -> np.ndarray:
+        """Rows not superseded by a re-analysis or delete."""
+        n = len(cols["document_id"])
+        if not self.cutoffs:
+            return np.ones(n, dtype=bool)
+        return np.arange(n) >= self._cutoffs()[cols["document_id"]]
+
+    def _cutoffs(self) -> np.ndarray:
+        cutoff = self._cutoff_array
+        if cutoff is None:
+            cutoff = np.zeros(len(self.dictionaries["document_id"]), dtype=np.int64)
+            for code, row in self.cutoffs.items():
+                cutoff[int(code)] = row
+            self._cutoff_array = cutoff
+        return cutoff
+
+    def _single_unit(self, cols: Dict[str, np.ndarray], mask: np.ndarray) -> Optional[str]:
+        """The one unit of the selected rows; mixing units would mix scales."""
+        codes = np.unique(cols["unit"][mask])
+        if len(codes) > 1:
+            units = ", ".join(self.dictionaries["unit"][c] for c in codes.tolist())
+            raise MixedUnitsError(f"Selected rows mix units ({units}); pass unit= to choose one")
+        return self.dictionaries["unit"][int(codes[0])] if len(codes) else None
+
+    def metrics(self, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Known metrics with their row counts, most common first."""
+        with self._reading():
+            cols = self._columns()
+            mask = self._visible(cols)
+            if user_id is not None:
+                user_code = self._codes["user_id"].get(user_id)
+                if user_code is None:
+                    return []
+                mask &= cols["user_id"] == user_code
+            codes = cols["metric"][mask]
+            counts = np.bincount(codes, minlength=len(self.dictionaries["metric"]))
+            order = np.argsort(-counts)
+            names = self.dictionaries["metric"]
+            return [{"metric": names[i], "rows": int(counts[i])} for i in order if counts[i]]
+
+    def series(
+        self,
+        metric: str,
+        user_id: Optional[str] = None,
+        document_ids: Optional[List[str]] = None,
+        unit: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Metric values per document, ordered by period."""
+        with self._reading():
+            cols = self._columns()
+            mask = self._mask(cols, metric, user_id, document_ids, unit)
+            unit = self._single_unit(cols, mask)
+            idx = np.nonzero(mask)[0]
+            order = idx[np.lexsort((cols["period"][idx], cols["document_id"][idx]))]
+
+            doc_names = self.dictionaries["document_id"]
+            series: Dict[str, List[Dict[str, Any]]] = {}
+            for doc, period, value in zip(
+                cols["document_id"][order].tolist(),
+                cols["period"][order].tolist(),
+                cols["value"][order].tolist(),
+            ):
+                series.setdefault(doc_names[doc], []).append({"period": period, "value": value})
+            return {"metric": metric, "unit": unit, "series": series}
+
+    def aggregate(
+        self,
+        metric: str,
+        group_by: str = "period",
+        agg: str = "sum",
+        user_id: Optional[str] = None,
+        document_ids: Optional[List[str]] = None,
+        unit: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Aggregate a metric across documents, grouped by period or document."""
+        if group_by not in GROUP_BY:
+            raise ValueError(f"group_by must be one of {', '.join(GROUP_BY)}")
+        if agg not in AGGREGATIONS:
+            raise ValueError(f"agg must be one of {', '.join(AGGREGATIONS)}")
+
+        with self._reading():
+            cols = self._columns()
+            mask = self._mask(cols, metric, user_id, document_ids, unit)
+            unit = self._single_unit(cols, mask)
+            keys, values = cols[group_by][mask], cols["value"][mask]
+            if len(keys) == 0:
+                return {"metric": metric, "unit": None, "groups": []}
+
+            groups, inverse = np.unique(keys, return_inverse=True)
+            counts = np.bincount(inverse, minlength=len(groups))
+            if agg == "count":
+                out = counts.astype(np.float64)
+            elif agg in ("sum", "mean"):
+                out = np.bincount(inverse, weights=values, minlength=len(groups))
+                if agg == "mean":
+                    out = out / counts
+            else:
+                out = np.full(len(groups), np.inf if agg == "min" else -np.inf)
+                (np.minimum if agg == "min" else np.maximum).at(out, inverse, values)
+
+            labels = (
+                groups.tolist() if group_by == "period"
+                else [self.dictionaries["document_id"][g] for g in groups.tolist()]
+            )
+            return {
+                "metric": metric,
+                "unit": unit,
+                "groups": [
+                    {group_by: label, "value": value, "count": count}
+                    for label, value, count in zip(labels, out.tolist(), counts.tolist())
+                ],
+            }
+
+
+statement_store = StatementStore()
@@ -0,0 +1,125 @@
+# stats.py
+import logging
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Union
+
+from db import db
+
+logger = logging.getLogger(__name__)
+
+# Pseudo user_id for the rollup across all users
+ALL_USERS = "__all__"
+
+# Upper bounds (seconds) of the processing-time histogram buckets
+PROCESSING_TIME_BUCKETS = [5, 10, 30, 60, 120, 300, 600]
+
+def _bucket_key(seconds: float) -> str:
+    for bound in PROCESSING_TIME_BUCKETS:
+        if seconds <= bound:
+            return f"le_{bound}"
+    return "le_inf"
+
+def _day(ts: Optional[datetime] = None) -> str:
+    return (ts or datetime.utcnow()).strftime("%Y-%m-%d")
+
+# Run events counted per day. These are counters of events, not current
+# document states: "started" is runs begun that day, not documents in flight.
+RUN_EVENTS = ("started", "completed", "completed_with_errors", "failed")
+COMPLETED_EVENTS = ("completed", "completed_with_errors")
+
+# ---------------- Writes ---------------- #
+async def record_run_event(
+    user_id: Optional[str],
+    event: str,
+    processing_time: Optional[float] = None,
+    pages: int = 0,
+    characters: int = 0,
+    crew_ran: bool = False,
+    crew_error: bool = False,
+) -> None:
+    """Atomically bump today's counters for the user and the global rollup."""
+    if event not in RUN_EVENTS:
+        raise ValueError(f"Unknown run event: {event}")
+
+    inc: Dict[str, Any] = {f"run_events.{event}": 1}
+    # Timing covers completed runs only, so early failures don't skew it
+    if event in COMPLETED_EVENTS and processing_time is not None:
+        inc["completed_time_sum"] = processing_time
+        inc["completed_time_count"] = 1
+        inc[f"completed_time_hist.{_bucket_key(processing_time)}"] = 1
+    if pages:
+        inc["pages_processed"] = pages
+    if characters:
+        inc["characters_processed"] = characters
+    if crew_ran:
+        inc["crew_runs"] = 1
+        if crew_error:
+            inc["crew_errors"] = 1
+
+    day = _day()
+    try:
+        for uid in {user_id or "anonymous", ALL_USERS}:
+            await db.usage_stats.update_one(
+                {"user_id": uid, "day": day},
+                {"$inc": inc, "$set": {"updated_at": datetime.utcnow()}},
+                upsert=True,
+            )
+    except Exception as e:
+        # Stats must never break an analysis
+        logger.warning(f"Failed to record stats for {user_id}: {e}")
+
+# ---------------- Reads ---------------- #
+def _percentile(hist: Dict[str, int], total: int, p: float) -> Union[float, str, None]:
+    """Upper bound of the bucket holding the p-th percentile, or ">N" past the last one."""
+    if not total:
+        return None
+    target = p * total
+    cumulative = 0
+    for bound in PROCESSING_TIME_BUCKETS:
+        cumulative += hist.get(f"le_{bound}", 0)
+        if cumulative >= target:
+            return float(bound)
+    return f">{PROCESSING_TIME_BUCKETS[-1]}"
+
+async def get_stats(user_id: str, days: int = 30) -> Dict[str, Any]:
+    """Merge the last `days` daily rows for a user (or ALL_USERS)."""
+    since = _day(datetime.utcnow() - timedelta(days=days - 1))
+    cursor = db.usage_stats.find({"user_id": user_id, "day": {"$gte": since}}).sort("day", 1)
+    rows: List[dict] = await cursor.to_list(length=days)
+
+    run_events: Dict[str, int] = {event: 0 for event in RUN_EVENTS}
+    hist: Dict[str, int] = {}
+    totals = {"completed_time_sum": 0.0, "completed_time_count": 0, "pages_processed": 0,
+              "characters_processed": 0, "crew_runs": 0, "crew_errors": 0}
+    daily = []
+    for row in rows:
+        for event, count in row.get("run_events", {}).items():
+            run_events[event] = run_events.get(event, 0) + count
+        for bucket, count in row.get("completed_time_hist", {}).items():
+            hist[bucket] = hist.get(bucket, 0) + count
+        for key in totals:
+            totals[key] += row.get(key, 0)
+        daily.append({"day": row["day"], "run_events": row.get("run_events", {})})
+
+    completed = totals["completed_time_count"]
+    percentiles = {
+        name: _percentile(hist, completed, p)
+        for name, p in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99))
+    }
+    crew_runs = totals["crew_runs"]
+    return {
+        "user_id": user_id,
+        "days": days,
+        "run_events": run_events,
+        "completed_runs": completed,
+        "pages_processed": totals["pages_processed"],
+        "characters_processed": totals["characters_processed"],
+        "processing_time": {
+            "avg_seconds": totals["completed_time_sum"] / completed if completed else None,
+            # Upper bucket bounds, in seconds
+            **percentiles,
+        },
+        "crew_runs": crew_runs,
+        "crew_error_rate": totals["crew_errors"] / crew_runs if crew_runs else None,
+        "daily": daily,
+    }
@@ -0,0 +1,172 @@
+# streaming.py
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from contextvars import ContextVar
+from typing import Optional, Dict, Any, List
+from bson import ObjectId
+
+from db import db
+
+logger = logging.getLogger(__name__)
+
+# ---------------- Config ---------------- #
+# Minimum seconds between partial-output writes to Mongo while a task streams
+STREAM_FLUSH_INTERVAL = float(os.getenv("STREAM_FLUSH_INTERVAL", "1.0"))
+# How often SSE clients check for new output
+STREAM_POLL_INTERVAL = float(os.getenv("STREAM_POLL_INTERVAL", "0.5"))
+
+FINAL_STATUSES = {"analyzed", "failed"}
+
+# ---------------- Per-analysis stream ---------------- #
+class AnalysisStream:
+    """
+    Accumulates streamed LLM output for one document's crew run.
+
+    Chunks arrive on the crew worker thread; partial output is flushed to
+    ``documents.partial_results`` at most every ``STREAM_FLUSH_INTERVAL``
+    seconds so other processes can serve it too.
+    """
+
+    def __init__(self, document_id: str, task_names: List[str], loop: asyncio.AbstractEventLoop):
+        self.document_id = document_id
+        self.task_names = task_names
+        self.outputs: Dict[str, str] = {name: "" for name in task_names}
+        self.current = 0
+        self.done = False
+        self._loop = loop
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+
+    @property
+    def current_task(self) -> Optional[str]:
+        if self.current < len(self.task_names):
+            return self.task_names[self.current]
+        return None
+
+    def append(self, chunk: str) -> None:
+        with self._lock:
+            task = self.current_task
+            if self.done or task is None or not chunk:
+                return
+            self.outputs[task] += chunk
+        self._maybe_flush()
+
+    def task_completed(self, _output: Any = None) -> None:
+        """Crew ``task_callback``: move on to the next task and flush."""
+        with self._lock:
+            self.current += 1
+        self._maybe_flush(force=True)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "outputs": dict(self.outputs),
+                "current_task": self.current_task,
+                "done": self.done,
+            }
+
+    def _maybe_flush(self, force: bool = False) -> None:
+        # A timed-out crew thread keeps emitting after the run is closed
+        if self.done:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < STREAM_FLUSH_INTERVAL:
+            return
+        self._last_flush = now
+        asyncio.run_coroutine_threadsafe(self.flush(), self._loop)
+
+    async def flush(self) -> None:
+        snapshot = self.snapshot()
+        try:
+            # Only while processing, so a late flush cannot undo the final $unset
+            await db.documents.update_one(
+                {"_id": ObjectId(self.document_id), "status": "processing"},
+                {"$set": {
+                    "partial_results": snapshot["outputs"],
+                    "current_task": snapshot["current_task"],
+                }}
+            )
+        except Exception as e:
+            logger.warning(f"Failed to flush partial output for {self.document_id}: {e}")
+
+
+# ---------------- Registry ---------------- #
+streams: Dict[str, AnalysisStream] = {}
+current_stream: ContextVar[Optional[AnalysisStream]] = ContextVar("current_stream", default=None)
+
+def open_stream(document_id: str, task_names: List[str]) -> AnalysisStream:
+    stream = AnalysisStream(document_id, task_names, asyncio.get_running_loop())
+    streams[document_id] = stream
+    return stream
+
+def close_stream(document_id: str) -> None:
+    stream = streams.pop(document_id, None)
+    if stream:
+        with stream._lock:
+            stream.done = True
+
+# CrewAI emits chunk events synchronously on the thread running kickoff;
+# asyncio.to_thread copies our context there, so current_stream identifies the run.
+try:
+    from crewai.utilities.events import crewai_event_bus, LLMStreamChunkEvent
+
+    @crewai_event_bus.on(LLMStreamChunkEvent)
+    def _on_llm_chunk(source, event):
+        stream = current_stream.get()
+        if stream is not None:
+            stream.append(event.chunk)
+except ImportError:
+    logger.warning("CrewAI streaming events unavailable; partial output will not be streamed.")
+
+# ---------------- SSE ---------------- #
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _load_snapshot(document_id: str) -> Optional[Dict[str, Any]]:
+    stream = streams.get(document_id)
+    if stream is not None:
+        snapshot = stream.snapshot()
+        snapshot["status"] = "processing"
+        return snapshot
+
+    doc = await db.documents.find_one(
+        {"_id": ObjectId(document_id)},
+        {"status": 1, "partial_results": 1, "current_task": 1}
+    )
+    if not doc:
+        return None
+    return {
+        "outputs": doc.get("partial_results") or {},
+        "current_task": doc.get("current_task"),
+        "status": doc.get("status"),
+        "done": doc.get("status") in FINAL_STATUSES,
+    }
+
+async def stream_events(document_id: str):
+    """Yield SSE ``delta`` events per task until the analysis finishes."""
+    sent: Dict[str, int] = {}
+    current_task = None
+    while True:
+        snapshot = await _load_snapshot(document_id)
+        if snapshot is None:
+            yield format_sse("error", {"message": "Document not found"})
+            return
+
+        if snapshot["current_task"] != current_task:
+            current_task = snapshot["current_task"]
+            yield format_sse("task", {"task": current_task})
+
+        for task, text in snapshot["outputs"].items():
+            offset = sent.get(task, 0)
+            if len(text) > offset:
+                yield format_sse("delta", {"task": task, "text": text[offset:]})
+                sent[task] = len(text)
+
+        if snapshot["done"]:
+            yield format_sse("done", {"status": snapshot["status"]})
+            return
+        await asyncio.sleep(STREAM_POLL_INTERVAL)
@@ -6,9 +6,15 @@ from bson import ObjectId
 
 from crewai import Task
 from agents import financial_analyst
-from tools import read_financial_document, analyze_investment_text
+from tools import (
+    read_financial_document_pages, join_pages, analyze_investment_text,
+    extract_statement_tables,
+)
 from crew_runner import run_crew_async
 from db import db
+from stats import record_run_event
+from profiling import profiled_by_document
+from statement_store import statement_store
 
 logger = logging.getLogger(__name__)
 
@@ -105,6 +111,7 @@ verification_task = Task(
 )
 
 # ---------------- Orchestrator ---------------- #
+@profiled_by_document
 async def analyze_document_and_save(
     document_id: str,
     file_path: str,
@@ -123,17 +130,27 @@ async def analyze_document_and_save(
             {"_id": ObjectId(document_id)},
             {"$set": {"status": "processing", "processing_started_at": start_time}}
         )
+        await record_run_event(user_id, "started")
 
-        # Extract text
-        doc_text = await read_financial_document(file_path)
+        # Extract text (pages are read once and reused for table extraction)
+        pages = await read_financial_document_pages(file_path)
+        doc_text = join_pages(pages)
         if not doc_text or len(doc_text.strip()) < 50:
             raise ValueError("Insufficient text extracted from document")
 
         # Local analysis
         local_summary = await analyze_investment_text(doc_text)
 
+        # Statement tables -> columnar store for cross-document queries
+        line_items = await extract_statement_tables(pages)
+        try:
+            local_summary["statement_line_items"] = await statement_store.append(document_id, user_id, line_items)
+        except Exception as e:
+            # The side store must never break an analysis
+            logger.warning(f"Failed to store statement line items for {document_id}: {e}")
+
         # Run CrewAI
-        crew_result = await run_crew_async(query, doc_text, timeout_s=300)
+        crew_result = await run_crew_async(query, doc_text, timeout_s=300, document_id=document_id)
 
         end_time = datetime.utcnow()
         processing_time = (end_time - start_time).total_seconds()
@@ -160,10 +177,21 @@ async def analyze_document_and_save(
                     "status": "analyzed",
                     "analysis_completed_at": end_time,
                     "processing_time_seconds": processing_time
-                }
+                },
+                "$unset": {"partial_results": "", "current_task": ""}
             }
         )
 
+        await record_run_event(
+            user_id,
+            status,
+            processing_time=processing_time,
+            pages=len(pages),
+            characters=len(doc_text),
+            crew_ran=True,
+            crew_error="error" in crew_result,
+        )
+
         return {"status": status, "processing_time": processing_time}
 
     except Exception as e:
@@ -181,7 +209,11 @@ async def analyze_document_and_save(
         })
         await db.documents.update_one(
             {"_id": ObjectId(document_id)},
-            {"$set": {"status": "failed", "error": error_msg, "failed_at": error_time}}
+            {
+                "$set": {"status": "failed", "error": error_msg, "failed_at": error_time},
+                "$unset": {"partial_results": "", "current_task": ""}
+            }
         )
+        await record_run_event(user_id, "failed")
 
         return {"status": "failed", "error": error_msg}
@@ -0,0 +1,39 @@
+import asyncio
+import threading
+import time
+
+from profiling import arm_document_profile, profiled_by_document, to_thread
+
+def busy(seconds):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        pass
+
+def run_work():
+    busy(0.3)
+
+def unrelated_work(stop):
+    while not stop.is_set():
+        busy(0.01)
+
+@profiled_by_document
+async def analyze(document_id):
+    await to_thread(run_work)
+
+def test_document_profile_samples_only_its_run():
+    stop = threading.Event()
+    other = threading.Thread(target=unrelated_work, args=(stop,), daemon=True)
+    other.start()
+    try:
+        profiler = arm_document_profile("doc-1")
+        asyncio.run(analyze("doc-1"))
+    finally:
+        stop.set()
+        other.join()
+
+    folded = profiler.folded()
+    assert "run_work" in folded
+    assert "unrelated_work" not in folded
+    assert profiler.info()["threads"] == "run"
+    assert profiler.info()["peak_active_runs"] == 1
+    assert not profiler.running
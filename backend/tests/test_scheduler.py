@@ -0,0 +1,116 @@
+import asyncio
+from collections import defaultdict
+
+from scheduler import AnalysisScheduler, LANE_BULK, LANE_INTERACTIVE
+
+class Jobs:
+    """Job bodies that record when they start and block until finished."""
+
+    def __init__(self):
+        self.started = []
+        self._done = defaultdict(asyncio.Event)
+
+    async def run(self, name):
+        self.started.append(name)
+        await self._done[name].wait()
+
+    async def finish(self, name):
+        self._done[name].set()
+        await settle()
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+def submit(scheduler, jobs, name, user, **kwargs):
+    return scheduler.submit(name, user, jobs.run, name, **kwargs)
+
+def test_interactive_job_overtakes_bulk_backlog():
+    async def scenario():
+        scheduler, jobs = AnalysisScheduler(max_concurrent=1), Jobs()
+        for i in range(10):
+            submit(scheduler, jobs, f"bulk-{i}", "bulk-user")
+        info = submit(scheduler, jobs, "mine", "other-user")
+        await settle()
+
+        assert jobs.started == ["bulk-0"]
+        assert scheduler.queue_info("bulk-9")["lane"] == LANE_BULK
+        assert info["lane"] == LANE_INTERACTIVE
+        assert info["queue_position"] == 1
+
+        await jobs.finish("bulk-0")
+        assert jobs.started == ["bulk-0", "mine"]
+        await scheduler.shutdown()
+
+    asyncio.run(scenario())
+
+def test_per_user_cap():
+    async def scenario():
+        scheduler, jobs = AnalysisScheduler(max_concurrent=4, max_per_user=2), Jobs()
+        for name in ("a-1", "a-2", "a-3"):
+            submit(scheduler, jobs, name, "a")
+        submit(scheduler, jobs, "b-1", "b")
+        await settle()
+
+        # A free slot is left idle rather than given to a user at their cap
+        assert jobs.started == ["a-1", "a-2", "b-1"]
+        assert scheduler.stats()["running"] == 3
+        assert scheduler.queue_info("a-3")["queue_position"] == 1
+
+        await jobs.finish("a-1")
+        assert jobs.started[-1] == "a-3"
+        await scheduler.shutdown()
+
+    asyncio.run(scenario())
+
+def test_cancel_pending_job():
+    async def scenario():
+        scheduler, jobs = AnalysisScheduler(max_concurrent=1), Jobs()
+        submit(scheduler, jobs, "first", "u1")
+        submit(scheduler, jobs, "second", "u2")
+        await settle()
+
+        assert scheduler.cancel("second") is True
+        assert scheduler.queue_info("second") is None
+        assert scheduler.cancel("unknown") is False
+
+        await jobs.finish("first")
+        assert jobs.started == ["first"]
+        assert scheduler.stats()["running"] == 0
+
+    asyncio.run(scenario())
+
+def test_cancel_and_wait_running_job():
+    async def scenario():
+        scheduler, jobs = AnalysisScheduler(max_concurrent=1), Jobs()
+        submit(scheduler, jobs, "first", "u1")
+        submit(scheduler, jobs, "second", "u2")
+        await settle()
+
+        assert await scheduler.cancel_and_wait("first") is True
+        assert scheduler.queue_info("first") is None
+        await settle()
+        assert jobs.started == ["first", "second"]
+        await scheduler.shutdown()
+
+    asyncio.run(scenario())
+
+def test_queue_info_positions():
+    async def scenario():
+        scheduler, jobs = AnalysisScheduler(max_concurrent=1), Jobs()
+        submit(scheduler, jobs, "running", "u1")
+        submit(scheduler, jobs, "u1-next", "u1")
+        submit(scheduler, jobs, "u2-next", "u2")
+        await settle()
+
+        assert scheduler.queue_info("running")["queue_position"] == 0
+        # u2 has run nothing yet, so its first job sorts ahead of u1's second
+        assert scheduler.queue_info("u2-next")["queue_position"] == 1
+        assert scheduler.queue_info("u1-next")["queue_position"] == 2
+        first, second = scheduler.queue_info("u2-next"), scheduler.queue_info("u1-next")
+        assert first["estimated_start_at"] < second["estimated_start_at"]
+        assert scheduler.queue_info("missing") is None
+
+        assert sorted(await scheduler.shutdown()) == ["running", "u1-next", "u2-next"]
+
+    asyncio.run(scenario())
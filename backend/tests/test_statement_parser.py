@@ -0,0 +1,75 @@
+from statement_parser import parse_statement_page, normalize_metric
+
+INCOME_STATEMENT = """CONSOLIDATED STATEMENTS OF OPERATIONS
+(in millions, except per share data)
+Year ended December 31, 2023 2022
+Net sales $ 383,285 $ 394,328
+Cost of revenue 1998 2045
+Other income (expense), net (565) (334)
+Net income (loss) 96,995 —
+Diluted earnings per share 6.13 6.11
+"""
+
+def rows_for(rows, metric):
+    return {r["period"]: r["value"] for r in rows if r["metric"] == metric}
+
+def test_header_sets_periods_and_scales_values():
+    rows = parse_statement_page(INCOME_STATEMENT)
+    assert rows_for(rows, "revenue") == {2023: 383_285e6, 2022: 394_328e6}
+    assert rows_for(rows, "other income (expense), net") == {2023: -565e6, 2022: -334e6}
+    assert {r["unit"] for r in rows if r["metric"] == "revenue"} == {"USD"}
+
+def test_row_of_year_like_values_is_not_a_header():
+    rows = parse_statement_page(INCOME_STATEMENT)
+    assert rows_for(rows, "cost of revenue") == {2023: 1998e6, 2022: 2045e6}
+    assert rows_for(rows, "net income") == {2023: 96_995e6}
+    assert {r["period"] for r in rows} == {2023, 2022}
+
+def test_per_share_values_are_not_scaled():
+    rows = parse_statement_page(INCOME_STATEMENT)
+    assert rows_for(rows, "diluted earnings per share") == {2023: 6.13, 2022: 6.11}
+    assert {r["unit"] for r in rows if "per share" in r["metric"]} == {"USD/share"}
+
+def test_bare_and_fiscal_year_headers():
+    page = "Balance Sheet\nFY2024 FY2023\nTotal equity 10 12\n2022 2021\nTotal equity 8 9\n"
+    rows = parse_statement_page(page)
+    assert rows_for(rows, "total equity") == {2024: 10, 2023: 12, 2022: 8, 2021: 9}
+    assert {r["unit"] for r in rows} == {"units"}
+
+def test_pages_without_statement_hints_are_skipped():
+    assert parse_statement_page("Management discussion\n2023 2022\nRevenue 1 2\n") == []
+
+def test_normalize_metric_aliases():
+    assert normalize_metric("  Total Revenues: ") == "revenue"
+    assert normalize_metric("Net earnings") == "net income"
+
+PER_SHARE_SECTIONS = """CONSOLIDATED STATEMENTS OF OPERATIONS
+(in millions, except number of shares and per share amounts)
+Years ended 2023 2022
+Net income $ 96,995 $ 99,803
+Earnings per share:
+Basic $ 6.16 $ 6.15
+Diluted $ 6.13 $ 6.11
+Shares used in computing earnings per share:
+Basic 15,744,231 16,215,963
+Diluted 15,812,547 16,325,819
+Operating expenses:
+Research and development 29,915 26,251
+Total operating expenses 54,847 51,345
+Revenue 383,285 394,328
+"""
+
+def test_sub_headers_scope_metrics_units_and_scaling():
+    rows = parse_statement_page(PER_SHARE_SECTIONS)
+    by_metric = {}
+    for r in rows:
+        by_metric.setdefault(r["metric"], {})[r["period"]] = (r["value"], r["unit"])
+
+    assert "basic" not in by_metric
+    assert by_metric["earnings per share: basic"] == {2023: (6.16, "USD/share"), 2022: (6.15, "USD/share")}
+    assert by_metric["shares used in computing earnings per share: basic"][2023] == (15_744_231, "shares")
+    assert by_metric["net income"][2023] == (96_995e6, "USD")
+    assert by_metric["operating expenses: research and development"][2023] == (29_915e6, "USD")
+    # "Total ..." closes the scope, so later rows keep their own names
+    assert by_metric["total operating expenses"][2023] == (54_847e6, "USD")
+    assert by_metric["revenue"][2023] == (383_285e6, "USD")
@@ -0,0 +1,74 @@
+import pytest
+
+from statement_store import StatementStore, MixedUnitsError
+
+def item(period, value, metric="revenue", unit="USD"):
+    return {"period": period, "metric": metric, "value": value, "unit": unit}
+
+def test_series_and_aggregate(tmp_path):
+    store = StatementStore(str(tmp_path))
+    store.append_sync("doc-a", "u1", [item(2023, 10.0), item(2022, 8.0), item(2023, 1.0, "net income")])
+    store.append_sync("doc-b", "u2", [item(2023, 5.0)])
+
+    series = store.series("revenue")
+    assert series["unit"] == "USD"
+    assert series["series"]["doc-a"] == [{"period": 2022, "value": 8.0}, {"period": 2023, "value": 10.0}]
+
+    result = store.aggregate("revenue", group_by="period", agg="sum")
+    assert result["groups"] == [
+        {"period": 2022, "value": 8.0, "count": 1},
+        {"period": 2023, "value": 15.0, "count": 2},
+    ]
+    assert store.aggregate("revenue", user_id="u2")["groups"] == [{"period": 2023, "value": 5.0, "count": 1}]
+
+def test_reanalysis_and_delete_hide_old_rows(tmp_path):
+    store = StatementStore(str(tmp_path))
+    store.append_sync("doc-a", "u1", [item(2023, 10.0)])
+    store.append_sync("doc-a", "u1", [item(2023, 12.0)])
+    assert store.series("revenue")["series"] == {"doc-a": [{"period": 2023, "value": 12.0}]}
+
+    store.delete_sync("doc-a")
+    assert store.series("revenue")["series"] == {}
+
+def test_append_after_delete_is_ignored(tmp_path):
+    store = StatementStore(str(tmp_path))
+    store.append_sync("doc-a", "u1", [item(2023, 10.0)])
+    store.delete_sync("doc-a")
+    # A cancelled run's worker thread finishing after the delete
+    assert store.append_sync("doc-a", "u1", [item(2023, 12.0)]) == 0
+    assert store.series("revenue")["series"] == {}
+
+    # Also when the run had not stored anything before the delete
+    store.delete_sync("doc-b")
+    StatementStore(str(tmp_path)).append_sync("doc-b", "u1", [item(2023, 1.0)])
+    assert store.series("revenue")["series"] == {}
+
+def test_metrics_ignore_hidden_rows(tmp_path):
+    store = StatementStore(str(tmp_path))
+    store.append_sync("doc-a", "u1", [item(2023, 10.0)])
+    store.append_sync("doc-a", "u1", [item(2023, 11.0)])
+    store.append_sync("doc-a", "u1", [item(2023, 12.0)])
+    assert store.metrics() == [{"metric": "revenue", "rows": 1}]
+
+    store.delete_sync("doc-a")
+    assert store.metrics() == []
+    assert store.metrics(user_id="unknown") == []
+
+def test_mixed_units_are_rejected(tmp_path):
+    store = StatementStore(str(tmp_path))
+    store.append_sync("doc-a", "u1", [item(2023, 10.0)])
+    store.append_sync("doc-b", "u1", [item(2023, 3.0, unit="units")])
+
+    with pytest.raises(MixedUnitsError):
+        store.aggregate("revenue")
+    assert store.aggregate("revenue", unit="USD")["groups"] == [{"period": 2023, "value": 10.0, "count": 1}]
+
+def test_other_process_appends_are_picked_up(tmp_path):
+    writer_a = StatementStore(str(tmp_path))
+    writer_b = StatementStore(str(tmp_path))
+    writer_a.append_sync("doc-a", "u1", [item(2023, 10.0)])
+    writer_b.append_sync("doc-b", "u1", [item(2023, 5.0)])
+    writer_a.append_sync("doc-c", "u1", [item(2023, 1.0)])
+
+    assert sorted(writer_b.series("revenue")["series"]) == ["doc-a", "doc-b", "doc-c"]
+    assert writer_a.aggregate("revenue")["groups"] == [{"period": 2023, "value": 16.0, "count": 3}]
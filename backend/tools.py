@@ -2,7 +2,6 @@
 import os
 import re
 import logging
-import asyncio
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -10,6 +9,8 @@ load_dotenv()
 logger = logging.getLogger(__name__)
 
 from crewai.tools import BaseTool
+from statement_parser import parse_statement_page
+from profiling import to_thread
 
 # ---------------- PDF Tool Class ---------------- #
 class ReadFinancialDocumentTool(BaseTool):
@@ -17,50 +18,54 @@ class ReadFinancialDocumentTool(BaseTool):
     description: str = "Reads and extracts text from a PDF financial document."
 
     async def _run(self, path: str) -> str:
+        return join_pages(await self.read_pages(path))
+
+    async def read_pages(self, path: str) -> list[str]:
+        """Per-page text with line breaks kept, falling back to OCR for scans."""
         if not isinstance(path, (str, Path)):
             raise ValueError("Path must be a string or Path object")
         path = str(path)
-        text = await self.extract_text_from_pdf(path)
-        if len(text.strip()) < 100:  # fallback to OCR
-            ocr_text = await self.ocr_pdf(path)
-            if len(ocr_text.strip()) > len(text.strip()):
-                text = ocr_text
-        if not text.strip():
+        pages = await self.extract_pages_from_pdf(path)
+        text = join_pages(pages)
+        if len(text) < 100:  # fallback to OCR
+            ocr_pages = await self.ocr_pdf_pages(path)
+            if len(join_pages(ocr_pages)) > len(text):
+                pages = ocr_pages
+        if not join_pages(pages):
             raise ValueError("No text could be extracted from the PDF")
-        return text
+        return pages
 
-    async def extract_text_from_pdf(self, path: str) -> str:
+    async def extract_pages_from_pdf(self, path: str) -> list[str]:
         from pypdf import PdfReader
 
         def _extract():
-            reader = PdfReader(path)
-            text_parts = []
-            for page in reader.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text_parts.append(page_text)
-            return "\n".join(text_parts)
+            return [page.extract_text() or "" for page in PdfReader(path).pages]
 
-        return re.sub(r'\s+', ' ', await asyncio.to_thread(_extract)).strip()
+        return await to_thread(_extract)
 
-    async def ocr_pdf(self, path: str) -> str:
+    async def extract_text_from_pdf(self, path: str) -> str:
+        return join_pages(await self.extract_pages_from_pdf(path))
+
+    async def ocr_pdf_pages(self, path: str) -> list[str]:
         try:
             from pdf2image import convert_from_path
             import pytesseract
 
             def _ocr():
-                text_parts = []
                 pages = convert_from_path(path, dpi=200, fmt="jpeg")
-                for page in pages:
-                    page_text = pytesseract.image_to_string(page, config='--psm 6')
-                    if page_text.strip():
-                        text_parts.append(page_text)
-                return "\n".join(text_parts)
+                return [pytesseract.image_to_string(page, config='--psm 6') for page in pages]
 
-            return re.sub(r'\s+', ' ', await asyncio.to_thread(_ocr)).strip()
+            return await to_thread(_ocr)
         except ImportError:
             logger.warning("OCR dependencies not installed. Install pdf2image and pytesseract for OCR support.")
-            return ""
+            return []
+
+    async def ocr_pdf(self, path: str) -> str:
+        return join_pages(await self.ocr_pdf_pages(path))
+
+def join_pages(pages: list[str]) -> str:
+    """Collapse per-page text into the single whitespace-normalised document text."""
+    return re.sub(r'\s+', ' ', "\n".join(p for p in pages if p.strip())).strip()
 
 # ---------------- Wrapper Functions ---------------- #
 async def read_financial_document(path: str) -> str:
@@ -68,6 +73,11 @@ async def read_financial_document(path: str) -> str:
     tool = ReadFinancialDocumentTool()
     return await tool._run(path)
 
+async def read_financial_document_pages(path: str) -> list[str]:
+    """Per-page text of a PDF, read once and shared by text and table extraction."""
+    tool = ReadFinancialDocumentTool()
+    return await tool.read_pages(path)
+
 async def analyze_investment_text(text: str) -> dict:
     """Basic financial text analysis without CrewAI dependencies."""
     if not text or not text.strip():
@@ -88,3 +98,18 @@ async def analyze_investment_text(text: str) -> dict:
         "confidence": min(len(found_keywords) / len(financial_keywords), 1.0),
         "analysis_type": "basic_text_analysis"
     }
+
+# ---------------- Financial Statement Tables ---------------- #
+async def extract_statement_tables(pages: list[str]) -> list[dict]:
+    """Detect financial statement tables in already-extracted page texts."""
+    def _extract():
+        rows = []
+        for page_text in pages:
+            rows.extend(parse_statement_page(page_text))
+        return rows
+
+    try:
+        return await to_thread(_extract)
+    except Exception as e:
+        logger.warning(f"Statement table extraction failed: {e}")
+        return []
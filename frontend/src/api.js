@@ -10,4 +10,29 @@ api.interceptors.request.use((config) => {
   return config;
 });
 
+// Server-sent events over fetch, since EventSource cannot send the auth header
+export async function streamAnalysis(documentId, onEvent, signal) {
+  const res = await fetch(`${API_BASE}/analyses/${documentId}/stream`, {
+    headers: { Authorization: `Bearer ${localStorage.getItem("token")}` },
+    signal,
+  });
+  if (!res.ok) throw new Error(`Stream failed: ${res.status}`);
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const messages = buffer.split("\n\n");
+    buffer = messages.pop();
+    for (const message of messages) {
+      const event = message.match(/^event: (.*)$/m)?.[1];
+      const data = message.match(/^data: (.*)$/m)?.[1];
+      if (event && data) onEvent(event, JSON.parse(data));
+    }
+  }
+}
+
 export default api;
@@ -1,11 +1,13 @@
 import { useEffect, useState } from "react";
 import { useParams } from "react-router-dom";
-import api from "../api";
+import api, { streamAnalysis } from "../api";
 
 export default function AnalysisResults() {
   const { documentId } = useParams();
   const [analyses, setAnalyses] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [live, setLive] = useState({});
+  const [liveTask, setLiveTask] = useState(null);
 
   const fetchAnalysis = async () => {
     try {
@@ -24,6 +26,28 @@ export default function AnalysisResults() {
     return () => clearInterval(interval);
   }, [documentId]);
 
+  useEffect(() => {
+    const controller = new AbortController();
+    setLive({});
+    streamAnalysis(
+      documentId,
+      (event, data) => {
+        if (event === "task") setLiveTask(data.task);
+        if (event === "delta")
+          setLive((prev) => ({
+            ...prev,
+            [data.task]: (prev[data.task] || "") + data.text,
+          }));
+        if (event === "done") {
+          setLiveTask(null);
+          fetchAnalysis();
+        }
+      },
+      controller.signal
+    ).catch(() => {});
+    return () => controller.abort();
+  }, [documentId]);
+
   if (loading) {
     return (
       <div className="max-w-3xl mx-auto mt-12 p-6 bg-white rounded-lg shadow-md text-center">
@@ -36,12 +60,32 @@ export default function AnalysisResults() {
     <div className="max-w-3xl mx-auto mt-12 space-y-6">
       <h2 className="text-2xl font-bold text-purple-600">Analysis Results</h2>
 
-      {analyses.length === 0 && (
+      {analyses.length === 0 && Object.keys(live).length === 0 && (
         <p className="text-gray-600">
           No results yet. Please check back later.
         </p>
       )}
 
+      {analyses.length === 0 && Object.keys(live).length > 0 && (
+        <div className="border border-gray-200 p-6 rounded-lg bg-white shadow-sm">
+          <p className="text-gray-800">
+            <strong className="text-purple-600">Status:</strong> processing
+            {liveTask && ` (${liveTask})`}
+          </p>
+          {Object.entries(live).map(
+            ([task, text]) =>
+              text && (
+                <div key={task} className="mt-4">
+                  <h3 className="font-semibold text-purple-600">{task}</h3>
+                  <pre className="whitespace-pre-wrap bg-gray-100 p-3 rounded text-sm text-gray-700">
+                    {text}
+                  </pre>
+                </div>
+              )
+          )}
+        </div>
+      )}
+
       {analyses.map((a) => (
         <div
           key={a._id}
@@ -6,6 +6,7 @@ export default function Dashboard() {
   const [docs, setDocs] = useState([]);
   const [page, setPage] = useState(0);
   const [total, setTotal] = useState(0);
+  const [stats, setStats] = useState(null);
   const limit = 5;
 
   const fetchDocs = async () => {
@@ -24,6 +25,13 @@ export default function Dashboard() {
     fetchDocs();
   }, [page]);
 
+  useEffect(() => {
+    api
+      .get("/stats", { params: { days: 30 } })
+      .then((res) => setStats(res.data))
+      .catch(() => console.error("Failed to fetch stats"));
+  }, []);
+
   const totalPages = Math.ceil(total / limit);
 
   return (
@@ -32,6 +40,31 @@ export default function Dashboard() {
         Your Documents
       </h2>
 
+      {stats && (
+        <div className="grid grid-cols-3 gap-4 mb-6 text-center">
+          <div className="p-3 bg-purple-50 rounded-lg">
+            <p className="text-xl font-bold text-purple-600">
+              {stats.completed_runs}
+            </p>
+            <p className="text-sm text-gray-600">Analyzed (30d)</p>
+          </div>
+          <div className="p-3 bg-purple-50 rounded-lg">
+            <p className="text-xl font-bold text-purple-600">
+              {stats.run_events.failed || 0}
+            </p>
+            <p className="text-sm text-gray-600">Failed (30d)</p>
+          </div>
+          <div className="p-3 bg-purple-50 rounded-lg">
+            <p className="text-xl font-bold text-purple-600">
+              {stats.processing_time.avg_seconds != null
+                ? `${Math.round(stats.processing_time.avg_seconds)}s`
+                : "–"}
+            </p>
+            <p className="text-sm text-gray-600">Avg. processing time</p>
+          </div>
+        </div>
+      )}
+
       {docs.length === 0 ? (
         <p className="text-gray-600">
           No documents found. Upload one to get started.
@@ -45,6 +78,15 @@ export default function Dashboard() {
             >
               <p className="font-semibold text-gray-800">{d.filename}</p>
               <p className="text-sm text-gray-600">Status: {d.status}</p>
+              {d.queue_position > 0 && (
+                <p className="text-sm text-gray-500">
+                  Queue position: {d.queue_position}
+                  {d.estimated_start_at &&
+                    ` · est. start ${new Date(
+                      d.estimated_start_at + "Z"
+                    ).toLocaleTimeString()}`}
+                </p>
+              )}
               <Link
                 to={`/analysis/${d._id}`}
                 className="text-purple-600 hover:text-purple-800 font-medium mt-2 inline-block"